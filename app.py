@@ -2,7 +2,7 @@ import os
 import streamlit as st
 from dotenv import load_dotenv
 
-from ingest_data import load_documents, scrape_web_page
+from ingest_data import load_uploaded_files, scrape_web_pages
 from rag_core import RAGCore
 
 # --- Environment Setup ---
@@ -19,8 +19,8 @@ def initialize_session_state():
     if 'rag_core' not in st.session_state:
         st.session_state.rag_core = RAGCore()
     
-    if 'chain_ready' not in st.session_state:
-        # Check if vector store exists and try to load it
+    if not st.session_state.get('chain_ready'):
+        # Check if the vector store exists (or another session has ingested) and try to load it
         if st.session_state.rag_core.load_existing_vectorstore():
             st.session_state.rag_core.setup_qa_chain()
             st.session_state.chain_ready = True
@@ -45,27 +45,21 @@ with st.sidebar:
         type=["pdf", "txt", "md"],
         accept_multiple_files=True
     )
-    url_to_scrape = st.text_input("Or scrape a technical documentation website")
+    urls_to_scrape = st.text_area("Or scrape technical documentation websites (one URL per line)")
+    urls = [url.strip() for url in urls_to_scrape.splitlines() if url.strip()]
 
     if st.button("Ingest Documents"):
-        if not uploaded_files and not url_to_scrape:
+        if not uploaded_files and not urls:
             st.warning("Please upload files or provide a URL to ingest.")
         else:
             with st.spinner("Ingesting documents... This may take a while."):
                 all_docs = []
                 
                 if uploaded_files:
-                    temp_dir = "temp_uploaded"
-                    if not os.path.exists(temp_dir):
-                        os.makedirs(temp_dir)
-                    for uploaded_file in uploaded_files:
-                        file_path = os.path.join(temp_dir, uploaded_file.name)
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                    all_docs.extend(load_documents(temp_dir))
-
-                if url_to_scrape:
-                    all_docs.extend(scrape_web_page(url_to_scrape))
+                    all_docs.extend(load_uploaded_files(uploaded_files))
+
+                if urls:
+                    all_docs.extend(scrape_web_pages(urls))
                 
                 st.session_state.rag_core.ingest_documents(all_docs)
                 st.session_state.rag_core.setup_qa_chain()
@@ -73,6 +67,8 @@ with st.sidebar:
                 st.success("Ingestion complete! You can now ask questions.")
 
     st.divider()
+    if st.session_state.rag_core.load_error:
+        st.error(st.session_state.rag_core.load_error)
     if st.session_state.chain_ready:
         st.success("Data has been ingested. The QA system is ready.")
     else:
@@ -81,9 +77,25 @@ with st.sidebar:
 # --- Main Chat Interface ---
 st.header("Ask Your Questions")
 
-for message in st.session_state.messages:
+@st.fragment
+def render_sources(sources, key: str):
+    """Renders source previews; toggling a full chunk only reruns this fragment."""
+    with st.expander("View Sources"):
+        for i, source in enumerate(sources):
+            st.markdown(f"**Source:** `{source['source']}`")
+            if st.toggle("Show full text", key=f"{key}-{i}"):
+                # A direct id lookup in the shared store; nothing to cache
+                full_text = st.session_state.rag_core.get_chunk_content(source['id']) or source['preview']
+                st.markdown(f"> {full_text.strip()}")
+            else:
+                st.markdown(f"> {source['preview'].strip()}")
+            st.divider()
+
+for message_num, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("sources"):
+            render_sources(message["sources"], key=f"sources-{message_num}")
 
 if prompt := st.chat_input("Ask a question about your documents"):
     if not st.session_state.chain_ready:
@@ -94,16 +106,12 @@ if prompt := st.chat_input("Ask a question about your documents"):
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.rag_core.ask_question(prompt)
-                answer = response.get('answer', 'Sorry, I could not find an answer.')
-                st.markdown(answer)
-                
-                if 'source_documents' in response and response['source_documents']:
-                    with st.expander("View Sources"):
-                        for doc in response['source_documents']:
-                            st.markdown(f"**Source:** `{doc.metadata.get('source', 'Unknown')}`")
-                            st.markdown(f"> {doc.page_content.strip()}")
-                            st.divider()
-
-        st.session_state.messages.append({"role": "assistant", "content": answer})
\ No newline at end of file
+            response = st.session_state.rag_core.ask_question_stream(prompt)
+            # Render tokens as they arrive instead of waiting for the full answer
+            answer = st.write_stream(response["answer_stream"]) or 'Sorry, I could not find an answer.'
+            sources = response.get('sources', [])
+            
+            if sources:
+                render_sources(sources, key=f"sources-{len(st.session_state.messages)}")
+
+        st.session_state.messages.append({"role": "assistant", "content": answer, "sources": sources})
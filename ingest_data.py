@@ -1,29 +1,87 @@
 import os
+import asyncio
+import multiprocessing
+import threading
 import fitz  
 import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict
+import requests_cache
+from selectolax.lexbor import LexborHTMLParser
+from typing import List, Dict, Optional, Union
+
+# PDFs with fewer pages than this are extracted in-process; process start-up would outweigh the gain
+PARALLEL_PDF_MIN_PAGES = 32
+
+# Scraped pages are served from a local SQLite cache for a day, then revalidated with
+# ETag / Last-Modified so unchanged pages come back as a cheap 304
+SCRAPE_CACHE_NAME = ".scrape_cache"
+SCRAPE_CACHE_EXPIRE_SECONDS = 86400
+
+_scrape_session = None
+_scrape_session_lock = threading.Lock()
+
+def _get_scrape_session() -> requests_cache.CachedSession:
+    """Creates the cached HTTP session on first use, so importing this module touches no files."""
+    global _scrape_session
+    with _scrape_session_lock:
+        if _scrape_session is None:
+            _scrape_session = requests_cache.CachedSession(
+                SCRAPE_CACHE_NAME, expire_after=SCRAPE_CACHE_EXPIRE_SECONDS, stale_if_error=True
+            )
+        return _scrape_session
+
+# --- PDF Worker Functions ---
+
+_worker_doc = None
+
+def _open_pdf(source: Union[str, bytes]) -> fitz.Document:
+    """Opens a PDF from a file path or from its raw bytes."""
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+def _init_pdf_worker(source: Union[str, bytes]):
+    """Opens the PDF once per worker process so pages can be extracted by number."""
+    global _worker_doc
+    _worker_doc = _open_pdf(source)
+
+def _extract_page(page_num: int) -> str:
+    """Extracts the plain text of a single page in a worker process."""
+    return _worker_doc.load_page(page_num).get_text("text")
 
 # --- Parsing Functions ---
 
-def parse_pdf(file_path: str) -> List[Dict]:
+def parse_pdf(source: Union[str, bytes], file_name: Optional[str] = None) -> List[Dict]:
     """
     Parses a PDF document, extracting text from each page.
+    `source` is either a file path or the PDF's raw bytes; `file_name` labels in-memory PDFs
+    (defaulting to "uploaded.pdf").
+    Large documents are split across a pool of worker processes.
     Returns a list of dictionaries, where each dictionary represents a page.
     """
-    if not os.path.exists(file_path):
-        print(f"Error: The file {file_path} does not exist.")
+    if isinstance(source, bytes):
+        file_name = file_name or "uploaded.pdf"
+    elif not os.path.exists(source):
+        print(f"Error: The file {source} does not exist.")
         return []
+    else:
+        file_name = file_name or os.path.basename(source)
+
+    with _open_pdf(source) as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_PDF_MIN_PAGES:
+            page_texts = [doc.load_page(page_num).get_text("text") for page_num in range(page_count)]
+        else:
+            page_texts = None
+
+    if page_texts is None:
+        workers = os.cpu_count() or 1
+        with multiprocessing.Pool(workers, initializer=_init_pdf_worker, initargs=(source,)) as pool:
+            page_texts = pool.map(_extract_page, range(page_count), chunksize=max(1, page_count // (workers * 4)))
 
-    doc = fitz.open(file_path)
-    pages_content = []
-    for page_num, page in enumerate(doc):
-        pages_content.append({
-            "source": f"{os.path.basename(file_path)} - Page {page_num + 1}",
-            "content": page.get_text()
-        })
-    doc.close()
-    return pages_content
+    return [{
+        "source": f"{file_name} - Page {page_num + 1}",
+        "content": text
+    } for page_num, text in enumerate(page_texts)]
 
 def parse_markdown(file_path: str) -> List[Dict]:
     """
@@ -57,27 +115,53 @@ def parse_text(file_path: str) -> List[Dict]:
         "content": content
     }]
 
+def extract_html_text(html: bytes) -> str:
+    """
+    Extracts the readable text from an HTML document using the lexbor parser.
+    """
+    tree = LexborHTMLParser(html)
+
+    # Remove non-content tags
+    for tag in tree.css('script, style, nav, footer, header'):
+        tag.decompose()
+
+    # Get clean text
+    root = tree.body or tree.root
+    return root.text(separator='\n', strip=True) if root else ""
+
 def scrape_web_page(url: str) -> List[Dict]:
     """
     Scrapes the textual content from a given URL.
     Returns a list containing a single dictionary for the web page.
     """
     try:
-        response = requests.get(url, timeout=10)
+        response = _get_scrape_session().get(url, timeout=10)
         response.raise_for_status()  
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Remove non-content tags
-        for tag in soup(['script', 'style', 'nav', 'footer', 'header']):
-            tag.decompose()
-
-        # Get clean text
-        text = soup.get_text(separator='\n', strip=True)
+        text = extract_html_text(response.content)
         return [{"source": url, "content": text}]
     except requests.RequestException as e:
         print(f"Error scraping {url}: {e}")
         return []
 
+async def _scrape_web_pages(urls: List[str]) -> List[Dict]:
+    """
+    Scrapes all URLs concurrently, running each cached request in a worker thread.
+    """
+    results = await asyncio.gather(*[asyncio.to_thread(scrape_web_page, url) for url in urls])
+    return [page for pages in results for page in pages]
+
+def scrape_web_pages(urls: List[str]) -> List[Dict]:
+    """
+    Scrapes several URLs concurrently.
+    Falls back to sequential scraping if an event loop is already running.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_scrape_web_pages(urls))
+    print("An event loop is already running, falling back to sequential requests.")
+    return [page for url in urls for page in scrape_web_page(url)]
+
 # --- Main Ingestion Logic ---
 
 def load_documents(source_dir: str) -> List[Dict]:
@@ -95,3 +179,19 @@ def load_documents(source_dir: str) -> List[Dict]:
             all_docs.extend(parse_text(file_path))
     return all_docs
 
+def load_uploaded_files(uploaded_files) -> List[Dict]:
+    """
+    Loads all supported documents from in-memory uploads (e.g. Streamlit's UploadedFile),
+    without writing them to disk first.
+    """
+    all_docs = []
+    for uploaded_file in uploaded_files:
+        filename = uploaded_file.name
+        if filename.endswith(".pdf"):
+            all_docs.extend(parse_pdf(uploaded_file.getvalue(), file_name=filename))
+        elif filename.endswith(".md") or filename.endswith(".txt"):
+            all_docs.append({
+                "source": filename,
+                "content": uploaded_file.getvalue().decode('utf-8')
+            })
+    return all_docs
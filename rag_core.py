@@ -1,11 +1,19 @@
 import os
-from typing import List, Dict, Any
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint
+import faiss
+import numpy as np
+import streamlit as st
+import torch
+from transformers import AutoTokenizer
+from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint, HuggingFaceEndpointEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from langchain.memory import ConversationBufferMemory
+from langchain_core.embeddings import Embeddings
+from langchain.memory import ConversationTokenBufferMemory
 
 # --- NEW/UPDATED IMPORTS ---
 from langchain_huggingface import ChatHuggingFace 
@@ -13,10 +21,38 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
+from vector_index import NumpyFaissStore, chunk_id
+
 # --- Constants ---
 LLM_REPO_ID = "mistralai/Mixtral-8x7B-Instruct-v0.1" 
 VECTORSTORE_DIR = "vectorstore"
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+EMBEDDING_BATCH_SIZE = 128 if EMBEDDING_DEVICE == "cuda" else 64
+# Texts per request to the embedding server; matches TEI's default --max-client-batch-size
+EMBEDDING_SERVER_BATCH_SIZE = 32
+# Chunk sizes are measured in embedding-model tokens; MiniLM truncates inputs at 256 tokens,
+# so chunks leave room for the [CLS] and [SEP] tokens it adds
+CHUNK_SIZE_TOKENS = 254
+CHUNK_OVERLAP_TOKENS = 32
+# Chunks embedded and inserted per step during ingestion; bounds peak memory on large corpora
+# and is the unit in which chunking, embedding and index writes overlap
+INGEST_BATCH_SIZE = 1024
+# Chunk batches prepared ahead of the embedding model during ingestion
+INGEST_PREFETCH_BATCHES = 2
+
+RETRIEVER_K = 4
+
+# --- HNSW Index Parameters ---
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Characters of each retrieved chunk returned as its preview; full text is fetched on demand
+SOURCE_PREVIEW_CHARS = 200
+
+# Token budget for the chat history included in each prompt; older turns are dropped first
+MEMORY_MAX_TOKENS = 2000
 
 # --- RAG Prompt Template for a CHAT model ---
 RAG_PROMPT = ChatPromptTemplate.from_messages(
@@ -26,47 +62,249 @@ RAG_PROMPT = ChatPromptTemplate.from_messages(
     ]
 )
 
+# --- Shared Resources ---
+# Loaded once per process and shared by every session's RAGCore.
+
+@st.cache_resource
+def get_embedding_model() -> Embeddings:
+    """Connects to the embedding server if one is configured, otherwise loads the sentence-transformers model."""
+    # Optional Text-Embeddings-Inference server, e.g. http://localhost:8080
+    server_url = os.getenv("EMBEDDING_SERVER_URL")
+    if server_url:
+        return HuggingFaceEndpointEmbeddings(model=server_url)
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={"device": EMBEDDING_DEVICE},
+        encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE, "normalize_embeddings": True},
+    )
+
+@st.cache_resource
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Creates a text splitter that measures length with the embedding model's fast tokenizer."""
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        tokenizer, chunk_size=CHUNK_SIZE_TOKENS, chunk_overlap=CHUNK_OVERLAP_TOKENS
+    )
+
+@st.cache_resource
+def get_llm() -> ChatHuggingFace:
+    """Creates the chat LLM backed by the Hugging Face Inference API."""
+    # 1. Define the base endpoint LLM
+    llm_endpoint = HuggingFaceEndpoint(
+        repo_id=LLM_REPO_ID,
+        huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
+        temperature=0.5,
+        max_new_tokens=512,
+        streaming=True,
+    )
+
+    # 2. Wrap the endpoint in the ChatHuggingFace class
+    return ChatHuggingFace(llm=llm_endpoint)
+
+class SharedVectorStore:
+    """Holds the vector store used by every session in this process."""
+
+    def __init__(self):
+        self.store: Optional[NumpyFaissStore] = None
+        # Guards the one-time load from disk and every publish of `store`; only ever held briefly
+        self.load_lock = threading.Lock()
+        # Serializes ingestions, which can run for minutes. Ingestion extends a copy and publishes
+        # it when done, so searches and page loads never wait on this lock.
+        self.ingest_lock = threading.Lock()
+
+@st.cache_resource
+def get_shared_vector_store() -> SharedVectorStore:
+    """Returns the process-wide vector store holder."""
+    return SharedVectorStore()
+
+@st.cache_data(ttl=3600, max_entries=1024)
+def _cached_retrieve(_store: NumpyFaissStore, store_version: str, ef_search: int, question: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """Searches the store, memoizing results per question for a given store version."""
+    # The leading underscore keeps Streamlit from hashing the store; its version token stands
+    # in for it, so results are never shared across different store contents
+    return [(doc.id, doc.page_content, doc.metadata) for doc in _store.similarity_search(question, k=RETRIEVER_K, ef_search=ef_search)]
+
+def _prefetch(iterable: Iterable, depth: int, stop: threading.Event) -> Iterator:
+    """
+    Iterates over `iterable` in a background thread, keeping up to `depth` items ready ahead of the consumer.
+    Setting `stop` (or closing this generator) makes the producer thread exit instead of blocking on a full buffer.
+    """
+    buffer = queue.Queue(maxsize=depth)
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except Exception as e:
+            put((False, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            has_item, item = buffer.get()
+            if not has_item:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
 class RAGCore:
     def __init__(self):
         """Initializes the RAG Core components."""
-        self.vector_store = None
+        self.shared_store = get_shared_vector_store()
+        self.load_error: Optional[str] = None
         self.qa_chain = None
-        self.retriever = None
-        self.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-        self.embedding_function = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-        
-        # 1. Define the base endpoint LLM
-        llm_endpoint = HuggingFaceEndpoint(
-            repo_id=LLM_REPO_ID,
-            huggingfacehub_api_token=os.getenv("HUGGINGFACEHUB_API_TOKEN"),
-            temperature=0.5,
-            max_new_tokens=512,
+        self.embedding_function = get_embedding_model()
+        self.llm = get_llm()
+        self.memory = ConversationTokenBufferMemory(
+            llm=self.llm, max_token_limit=MEMORY_MAX_TOKENS, memory_key="chat_history", return_messages=True
         )
 
-        # 2. Wrap the endpoint in the ChatHuggingFace class
+    @property
+    def vector_store(self) -> Optional[NumpyFaissStore]:
+        """The vector store currently published for this process, if any."""
+        return self.shared_store.store
+
+    def _create_vector_store(self, dim: int) -> NumpyFaissStore:
+        """Creates an empty FAISS store backed by an HNSW graph over int8-quantized vectors."""
+        # Stored vectors are scalar-quantized to 8 bits; queries stay float32 (asymmetric search)
+        index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        # Vectors are L2-normalized, so every component lies in [-1, 1]. Training on that fixed range,
+        # rather than on the first batch, keeps a small first ingest from collapsing later codes
+        index.train(np.vstack([-np.ones(dim), np.ones(dim)]).astype(np.float32))
+        return NumpyFaissStore(self.embedding_function, index)
 
-        self.llm = ChatHuggingFace(llm=llm_endpoint)
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts, splitting them into request-sized batches when using the embedding server."""
+        if not isinstance(self.embedding_function, HuggingFaceEndpointEmbeddings):
+            return self.embedding_function.embed_documents(texts)
+        embeddings = []
+        for start in range(0, len(texts), EMBEDDING_SERVER_BATCH_SIZE):
+            embeddings.extend(self.embedding_function.embed_documents(texts[start:start + EMBEDDING_SERVER_BATCH_SIZE]))
+        return embeddings
 
     def load_existing_vectorstore(self):
-        """Loads the vector store and initializes the retriever."""
-        if os.path.exists(VECTORSTORE_DIR):
-            print("Loading existing vector store...")
-            self.vector_store = Chroma(persist_directory=VECTORSTORE_DIR, embedding_function=self.embedding_function)
-            self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 4})
-            print("Vector store loaded and retriever is ready.")
+        """Loads the vector store, unless another session in this process already has."""
+        if self.vector_store is not None:
+            return True
+        with self.shared_store.load_lock:
+            if self.shared_store.store is None and NumpyFaissStore.exists(VECTORSTORE_DIR):
+                print("Loading existing vector store...")
+                try:
+                    self.shared_store.store = NumpyFaissStore.load_local(VECTORSTORE_DIR, self.embedding_function)
+                    self.load_error = None
+                except (OSError, ValueError) as e:
+                    # Reported in the UI; a new ingestion writes a fresh version and recovers
+                    self.load_error = f"The saved vector store could not be loaded: {e}"
+                    print(self.load_error)
+        if self.vector_store is not None:
+            print("Vector store loaded and ready.")
             return True
         print("Vector store not found.")
         return False
 
     def ingest_documents(self, source_documents: List[Dict[str, Any]]):
-        """Processes and ingests documents into a new vector store."""
+        """Processes and ingests documents into the shared vector store."""
         if not source_documents: return
         docs_to_process = [Document(page_content=doc['content'], metadata={'source': doc['source']}) for doc in source_documents]
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunked_docs = text_splitter.split_documents(docs_to_process)
-        self.vector_store = Chroma.from_documents(documents=chunked_docs, embedding=self.embedding_function, persist_directory=VECTORSTORE_DIR)
-        self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 4})
-        print("Ingestion complete. Retriever is ready.")
+
+        with self.shared_store.ingest_lock:
+            # Make sure a store saved on disk is extended rather than overwritten
+            self.load_existing_vectorstore()
+            # Extend a copy so other sessions keep searching the published store meanwhile
+            store = self.vector_store.copy() if self.vector_store is not None else None
+
+            # Resolved here: cached resources need the script thread's context, not the producer's
+            new_chunks = self._iter_new_chunks(docs_to_process, get_text_splitter(), self.vector_store)
+
+            # Chunking runs ahead on a background thread and index writes drain on another, so the
+            # embedding model works on one batch while the next is split and the previous is inserted
+            stop_chunking = threading.Event()
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                writes = []
+                try:
+                    batches = _prefetch(new_chunks, INGEST_PREFETCH_BATCHES, stop_chunking)
+                    for batch, batch_ids in batches:
+                        texts = [doc.page_content for doc in batch]
+                        embeddings = self._embed_documents(texts)
+                        if store is None:
+                            store = self._create_vector_store(len(embeddings[0]))
+                        # New chunks are appended to the graph rather than rebuilding it
+                        writes.append(writer.submit(
+                            store.add_embeddings,
+                            list(zip(texts, embeddings)),
+                            metadatas=[doc.metadata for doc in batch],
+                            ids=batch_ids,
+                        ))
+                finally:
+                    # Releases the chunking thread if embedding failed or the script was stopped
+                    stop_chunking.set()
+                for write in writes:
+                    write.result()
+
+            if not writes:
+                print("No new content to ingest.")
+                return
+
+            # The index is persisted once, after every batch has been written, then published
+            store.save_local(VECTORSTORE_DIR)
+            with self.shared_store.load_lock:
+                self.shared_store.store = store
+        print("Ingestion complete. Vector store is ready.")
+
+    def _iter_new_chunks(
+        self, docs: List[Document], text_splitter: RecursiveCharacterTextSplitter, existing: Optional[NumpyFaissStore]
+    ) -> Iterator[Tuple[List[Document], List[int]]]:
+        """Splits documents lazily, yielding batches of chunks (and their ids) not already in `existing`."""
+        # `existing` is the published store, which is never written to during ingestion
+        seen_ids = set()
+        batch, batch_ids = [], []
+        for doc in docs:
+            for chunk in text_splitter.split_documents([doc]):
+                doc_id = chunk_id(chunk.page_content, chunk.metadata['source'])
+                if doc_id in seen_ids or (existing is not None and existing.has_id(doc_id)):
+                    continue
+                seen_ids.add(doc_id)
+                batch.append(chunk)
+                batch_ids.append(doc_id)
+                if len(batch) == INGEST_BATCH_SIZE:
+                    yield batch, batch_ids
+                    batch, batch_ids = [], []
+        if batch:
+            yield batch, batch_ids
+
+    def _retrieve(self, question: str, ef_search: int) -> List[Document]:
+        """Retrieves the relevant documents for a question, reusing cached results where possible."""
+        store = self.vector_store
+        results = _cached_retrieve(store, store.version, ef_search, question)
+        return [Document(id=doc_id, page_content=content, metadata=metadata) for doc_id, content, metadata in results]
+
+    def _source_records(self, docs: List[Document]) -> List[Dict[str, str]]:
+        """Reduces retrieved documents to compact records for display."""
+        return [
+            {"id": doc.id, "source": doc.metadata.get('source', 'Unknown'), "preview": doc.page_content[:SOURCE_PREVIEW_CHARS]}
+            for doc in docs
+        ]
+
+    def get_chunk_content(self, chunk_id: str) -> str:
+        """Returns the full text of a stored chunk, or an empty string if it is unknown."""
+        docs = self.vector_store.get_by_ids([chunk_id]) if self.vector_store else []
+        return docs[0].page_content if docs else ""
 
     def _format_docs(self, docs: List[Document]) -> str:
         """Helper function to format retrieved documents into a single string."""
@@ -74,17 +312,17 @@ class RAGCore:
 
     def setup_qa_chain(self):
         """Sets up the conversational QA chain using LCEL."""
-        if not self.retriever:
-            print("Retriever is not available. Cannot set up QA chain.")
+        if self.vector_store is None:
+            print("Vector store is not available. Cannot set up QA chain.")
             return
 
         def get_chat_history(inputs):
             return self.memory.load_memory_variables(inputs).get("chat_history", [])
 
-        # The new LCEL chain definition
+        # The new LCEL chain definition; retrieved context is supplied by the caller
         self.qa_chain = (
             {
-                "context": lambda x: self._format_docs(self.retriever.invoke(x["question"])),
+                "context": lambda x: x["context"],
                 "question": lambda x: x["question"],
                 "chat_history": get_chat_history,
             }
@@ -94,17 +332,41 @@ class RAGCore:
         )
         print("LCEL QA Chain is ready.")
 
-    def ask_question(self, question: str) -> Dict[str, Any]:
-        """Asks a question to the QA chain, manages memory, and returns the response."""
+    def ask_question(self, question: str, ef_search: Optional[int] = None) -> Dict[str, Any]:
+        """Asks a question to the QA chain, manages memory, and returns the response.
+
+        Sources are returned as compact {"id", "source", "preview"} records; see `get_chunk_content`.
+        `ef_search` optionally overrides the HNSW search breadth: higher values trade latency for recall.
+        """
         if not self.qa_chain:
             return {"answer": "The QA system is not initialized."}
 
-        relevant_docs = self.retriever.invoke(question)
+        relevant_docs = self._retrieve(question, ef_search or HNSW_EF_SEARCH)
         
         # The chain now correctly manages the history via the lambda function
-        answer = self.qa_chain.invoke({"question": question})
+        answer = self.qa_chain.invoke({"question": question, "context": self._format_docs(relevant_docs)})
         
         # Manually save context to memory
         self.memory.save_context({"question": question}, {"answer": answer})
         
-        return {"answer": answer, "source_documents": relevant_docs}
\ No newline at end of file
+        return {"answer": answer, "sources": self._source_records(relevant_docs)}
+
+    def ask_question_stream(self, question: str, ef_search: Optional[int] = None) -> Dict[str, Any]:
+        """Like `ask_question`, but returns the answer as a generator of text chunks under "answer_stream".
+
+        Memory is updated once the stream has been fully consumed.
+        """
+        if not self.qa_chain:
+            return {"answer_stream": iter(["The QA system is not initialized."])}
+
+        relevant_docs = self._retrieve(question, ef_search or HNSW_EF_SEARCH)
+        context = self._format_docs(relevant_docs)
+
+        def answer_stream():
+            chunks = []
+            for chunk in self.qa_chain.stream({"question": question, "context": context}):
+                chunks.append(chunk)
+                yield chunk
+            self.memory.save_context({"question": question}, {"answer": "".join(chunks)})
+
+        return {"answer_stream": answer_stream(), "sources": self._source_records(relevant_docs)}
\ No newline at end of file
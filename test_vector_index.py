@@ -0,0 +1,87 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_index import VERSION_DIR_PREFIX, NumpyFaissStore, chunk_id
+
+DIM = 32
+TEXTS = ["alpha guide", "beta reference", "gamma tutorial", "delta changelog"]
+METADATAS = [{"source": f"doc{i}.md"} for i in range(len(TEXTS))]
+
+
+@pytest.fixture
+def embedding():
+    return DeterministicFakeEmbedding(size=DIM)
+
+
+def make_store(embedding):
+    index = faiss.IndexHNSWSQ(DIM, faiss.ScalarQuantizer.QT_8bit, 16, faiss.METRIC_INNER_PRODUCT)
+    index.train(np.vstack([-np.ones(DIM), np.ones(DIM)]).astype(np.float32))
+    store = NumpyFaissStore(embedding, index)
+    # Two batches, so the pending arrays are consolidated across add calls
+    for start in (0, 2):
+        texts = TEXTS[start:start + 2]
+        store.add_embeddings(zip(texts, embedding.embed_documents(texts)), METADATAS[start:start + 2])
+    return store
+
+
+def test_round_trip_keeps_rows_aligned(embedding, tmp_path):
+    store = make_store(embedding)
+    store.save_local(str(tmp_path))
+
+    loaded = NumpyFaissStore.load_local(str(tmp_path), embedding)
+
+    assert loaded.index.ntotal == len(TEXTS)
+    assert loaded.texts == TEXTS
+    assert loaded.metadatas == METADATAS
+    assert loaded.ids.tolist() == [chunk_id(text, meta["source"]) for text, meta in zip(TEXTS, METADATAS)]
+    np.testing.assert_allclose(loaded.vectors, store.vectors)
+
+
+def test_round_trip_keeps_text_separate_from_metadata_keys(embedding, tmp_path):
+    store = NumpyFaissStore.from_texts(["hello"], embedding, metadatas=[{"text": "meta", "source": "a.md"}])
+    store.save_local(str(tmp_path))
+
+    loaded = NumpyFaissStore.load_local(str(tmp_path), embedding)
+
+    assert loaded.texts == ["hello"]
+    assert loaded.metadatas == [{"text": "meta", "source": "a.md"}]
+
+
+def test_resave_switches_version_and_removes_the_old_one(embedding, tmp_path):
+    store = make_store(embedding)
+    store.save_local(str(tmp_path))
+    store.add_embeddings(zip(["epsilon notes"], embedding.embed_documents(["epsilon notes"])), [{"source": "doc4.md"}])
+    store.save_local(str(tmp_path))
+
+    loaded = NumpyFaissStore.load_local(str(tmp_path), embedding)
+
+    assert loaded.texts == TEXTS + ["epsilon notes"]
+    assert len([name for name in os.listdir(tmp_path) if name.startswith(VERSION_DIR_PREFIX)]) == 1
+
+
+def test_get_by_ids(embedding, tmp_path):
+    make_store(embedding).save_local(str(tmp_path))
+    loaded = NumpyFaissStore.load_local(str(tmp_path), embedding)
+
+    wanted = str(chunk_id(TEXTS[2], METADATAS[2]["source"]))
+    docs = loaded.get_by_ids([wanted, "12345"])
+
+    assert [(doc.id, doc.page_content, doc.metadata) for doc in docs] == [(wanted, TEXTS[2], METADATAS[2])]
+    assert loaded.has_id(int(wanted))
+
+
+def test_search_on_loaded_store(embedding, tmp_path):
+    make_store(embedding).save_local(str(tmp_path))
+    loaded = NumpyFaissStore.load_local(str(tmp_path), embedding)
+
+    results = loaded.similarity_search_with_score(TEXTS[1], k=2, ef_search=32)
+
+    assert len(results) == 2
+    top, score = results[0]
+    assert top.page_content == TEXTS[1]
+    assert top.metadata == METADATAS[1]
+    assert score == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# --- On-disk Layout ---
+# Each save goes to a fresh version directory; CURRENT names the one to load
+CURRENT_FILE = "CURRENT"
+VERSION_DIR_PREFIX = "v-"
+INDEX_FILE = "index.faiss"
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.npy"
+CHUNKS_FILE = "chunks.parquet"
+
+# Candidates fetched from the quantized index per requested result, before exact rescoring
+RESCORE_FACTOR = 4
+
+faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+
+def chunk_id(text: str, source: str = "") -> int:
+    """Derives a stable 64-bit id for a chunk from its source and content."""
+    digest = hashlib.blake2b(f"{source}\0{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class NumpyFaissStore(VectorStore):
+    """
+    A LangChain vector store that searches a FAISS index and persists its data without pickle.
+
+    Row i of the index corresponds to row i of `embeddings` (float32, [N, dim]), `ids` (uint64),
+    and the chunk texts/metadata. Arrays are saved as .npy and memory-mapped on load, the chunk
+    table is stored as Parquet (a text column plus a JSON metadata column). The embeddings are kept as one contiguous, L2-normalized
+    row-major matrix so candidate rescoring is a single BLAS matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        index: faiss.Index,
+        embeddings: Optional[np.ndarray] = None,
+        ids: Optional[np.ndarray] = None,
+        texts: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.embedding_function = embedding
+        self.index = index
+        self._vectors = embeddings if embeddings is not None else np.empty((0, index.d), dtype=np.float32)
+        self._ids = ids if ids is not None else np.empty(0, dtype=np.uint64)
+        # Batches added since the arrays were last consolidated, so a multi-batch ingest copies
+        # the [N, dim] matrix once rather than once per batch
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_ids: List[np.ndarray] = []
+        self.texts = texts or []
+        self.metadatas = metadatas or []
+        self._row_by_id = None
+        # Identifies this exact store contents, e.g. for cache keys; regenerated on every add
+        self.version = uuid.uuid4().hex
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The stored embeddings as one contiguous float32 [N, dim] matrix."""
+        self._consolidate()
+        return self._vectors
+
+    @property
+    def ids(self) -> np.ndarray:
+        """The stored chunk ids (uint64), row-aligned with `vectors`."""
+        self._consolidate()
+        return self._ids
+
+    def _consolidate(self):
+        if self._pending_vectors:
+            self._vectors = np.concatenate([self._vectors, *self._pending_vectors])
+            self._ids = np.concatenate([self._ids, *self._pending_ids])
+            self._pending_vectors, self._pending_ids = [], []
+
+    # --- Writing ---
+
+    def add_embeddings(
+        self,
+        text_embeddings: Iterable[Tuple[str, List[float]]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[int]] = None,
+    ) -> List[str]:
+        """
+        Adds texts with precomputed embeddings, training the index first if it requires it.
+        Ids default to `chunk_id` of each text and its metadata's source.
+        """
+        texts, vectors = zip(*text_embeddings)
+        metadatas = metadatas or [{} for _ in texts]
+        if ids is None:
+            ids = [chunk_id(text, metadata.get("source", "")) for text, metadata in zip(texts, metadatas)]
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        self.index.add(vectors)
+
+        self._pending_vectors.append(vectors)
+        self._pending_ids.append(np.asarray(ids, dtype=np.uint64))
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self._row_by_id = None
+        self.version = uuid.uuid4().hex
+        return [str(new_id) for new_id in ids]
+
+    def _row_of(self, chunk_id: int) -> Optional[int]:
+        if self._row_by_id is None:
+            self._row_by_id = {stored_id: row for row, stored_id in enumerate(self.ids.tolist())}
+        return self._row_by_id.get(chunk_id)
+
+    def has_id(self, chunk_id: int) -> bool:
+        """Checks whether a chunk with this id is already stored."""
+        return self._row_of(chunk_id) is not None
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        """Returns the stored chunks for the given ids, skipping unknown ones."""
+        rows = [self._row_of(int(chunk_id)) for chunk_id in ids]
+        return [self._document(row) for row in rows if row is not None]
+
+    def _document(self, row: int) -> Document:
+        return Document(id=str(self.ids[row]), page_content=self.texts[row], metadata=dict(self.metadatas[row]))
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self.embedding_function.embed_documents(texts)), metadatas)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "NumpyFaissStore":
+        """Builds a store over a flat inner-product index; pass `index` to use a different one."""
+        vectors = embedding.embed_documents(texts)
+        index = kwargs.get("index") or faiss.IndexFlatIP(len(vectors[0]))
+        store = cls(embedding, index)
+        store.add_embeddings(zip(texts, vectors), metadatas)
+        return store
+
+    # --- Searching ---
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, ef_search: Optional[int] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """
+        Searches the index for `query`. `ef_search` overrides the HNSW search breadth for this
+        query only, leaving the index's own setting untouched for concurrent readers.
+        """
+        query_vector = np.ascontiguousarray([self.embedding_function.embed_query(query)], dtype=np.float32)
+        faiss.normalize_L2(query_vector)
+        params = faiss.SearchParametersHNSW(efSearch=ef_search) if ef_search else None
+
+        # Over-fetch from the quantized index, then rescore the candidates exactly on the float32 rows
+        _, rows = self.index.search(query_vector, k * RESCORE_FACTOR, params=params)
+        rows = rows[0][rows[0] != -1]
+        scores = self.vectors[rows] @ query_vector[0]
+        best = np.argsort(-scores)[:k]
+        return [(self._document(rows[i]), float(scores[i])) for i in best]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def copy(self) -> "NumpyFaissStore":
+        """
+        Returns an independent copy that can be extended while this store keeps serving searches.
+        The arrays are shared, since they are only ever replaced, never modified in place.
+        """
+        return NumpyFaissStore(
+            self.embedding_function, faiss.clone_index(self.index), self.vectors, self.ids, list(self.texts), list(self.metadatas)
+        )
+
+    def _select_relevance_score_fn(self):
+        # Embeddings are normalized, so inner-product scores are already cosine similarities
+        return lambda score: score
+
+    # --- Persistence ---
+
+    def save_local(self, folder_path: str):
+        """
+        Writes the index, arrays and chunk table to a new version directory under `folder_path`,
+        then atomically repoints `CURRENT` at it. A crash mid-save leaves the previous version
+        current, and readers with its arrays memory-mapped keep valid files.
+
+        Every save writes the whole store, since the HNSW graph has no incremental on-disk
+        format; saving therefore costs O(corpus size) time and disk I/O.
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        version_name = VERSION_DIR_PREFIX + uuid.uuid4().hex
+        version_dir = os.path.join(folder_path, version_name)
+        os.makedirs(version_dir)
+        try:
+            faiss.write_index(self.index, os.path.join(version_dir, INDEX_FILE))
+            np.save(os.path.join(version_dir, EMBEDDINGS_FILE), self.vectors)
+            np.save(os.path.join(version_dir, IDS_FILE), self.ids)
+            # Metadata is kept in its own JSON column so its keys can never clash with the text column
+            table = pa.table({
+                "text": pa.array(self.texts, type=pa.string()),
+                "metadata": pa.array([json.dumps(metadata) for metadata in self.metadatas], type=pa.string()),
+            })
+            pq.write_table(table, os.path.join(version_dir, CHUNKS_FILE))
+            for file_name in (INDEX_FILE, EMBEDDINGS_FILE, IDS_FILE, CHUNKS_FILE):
+                _fsync(os.path.join(version_dir, file_name))
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+
+        pointer_path = os.path.join(folder_path, CURRENT_FILE)
+        with open(pointer_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(version_name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_path + ".tmp", pointer_path)
+
+        # Older versions are unreferenced now; on POSIX, existing mappings of their files stay valid
+        for name in os.listdir(folder_path):
+            if name.startswith(VERSION_DIR_PREFIX) and name != version_name:
+                shutil.rmtree(os.path.join(folder_path, name), ignore_errors=True)
+
+    @classmethod
+    def load_local(cls, folder_path: str, embedding: Embeddings) -> "NumpyFaissStore":
+        """Loads the current saved version; the arrays are memory-mapped rather than read into RAM."""
+        with open(os.path.join(folder_path, CURRENT_FILE), encoding="utf-8") as f:
+            version_dir = os.path.join(folder_path, f.read().strip())
+        index = faiss.read_index(os.path.join(version_dir, INDEX_FILE))
+        vectors = np.load(os.path.join(version_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        ids = np.load(os.path.join(version_dir, IDS_FILE), mmap_mode="r")
+        chunks = pq.read_table(os.path.join(version_dir, CHUNKS_FILE))
+        texts = chunks.column("text").to_pylist()
+        metadatas = [json.loads(metadata) for metadata in chunks.column("metadata").to_pylist()]
+        if not index.ntotal == len(vectors) == len(ids) == len(texts):
+            raise ValueError(f"Vector store files in {version_dir} are out of step with each other; re-ingest the documents.")
+        return cls(embedding, index, vectors, ids, texts, metadatas)
+
+    @staticmethod
+    def exists(folder_path: str) -> bool:
+        """Checks whether a saved store is present in `folder_path`."""
+        return os.path.exists(os.path.join(folder_path, CURRENT_FILE))
+
+
+def _fsync(path: str):
+    """Flushes a written file to disk before it becomes reachable through `CURRENT`."""
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())